@@ -1,16 +1,20 @@
 #!/usr/bin/env python3 
 
-import argparse
+import json
 import os
-import readline
-import shutil
 import subprocess
 import sys
 import signal
 import termios
+import time
 
 # Configs
 display_container_status = True
+# The menu always runs as root (container_interface re-execs under sudo),
+# so keep the cache directly in /run; /run/user/0 only exists while root
+# has a logind session.
+state_cache_path = "/run/lxc-shell-menu.json"
+state_cache_ttl = 2.0
 
 original_terminal_settings = None
 
@@ -37,127 +41,225 @@ def install():
         return
 
     target_path = "/usr/local/bin/lxc-shell-menu"
+    fast_path = "/usr/local/bin/lxc-shell-menu-fast"
 
+    import shutil
     try:
-        subprocess.run(
-            ["cp", os.path.abspath(__file__), target_path], 
-            check=True
-        )
-        subprocess.run(
-            ["chmod", "755", target_path], 
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
+        shutil.copyfile(os.path.abspath(__file__), target_path)
+        os.chmod(target_path, 0o755)
+    except OSError as e:
         print(f"Error: {e}")
         return
     print(f"Copied script to {target_path}")
 
     bashrc_path = os.path.expanduser("~/.bashrc")
-    command = "lxc-shell-menu --bashrc"
+    # Prefer the compiled binary (built with `make fast`) for the
+    # per-shell hook; it skips interpreter startup entirely. If the other
+    # variant was installed earlier, replace it so the menu never runs
+    # twice per shell.
+    if os.path.exists(fast_path):
+        command = "lxc-shell-menu-fast --bashrc"
+        stale_command = "lxc-shell-menu --bashrc"
+    else:
+        command = "lxc-shell-menu --bashrc"
+        stale_command = "lxc-shell-menu-fast --bashrc"
     with open(bashrc_path, "r") as bashrc:
-        if command not in bashrc.read():
-            with open(bashrc_path, "a") as bashrc_append:
-                bashrc_append.write(f"\n{command}\n")
-            print(f"Added '{command}' to {bashrc_path}")
-        else:
-            print(f"'{command}' already exists in {bashrc_path}")
+        lines = bashrc.readlines()
+    if any(line.strip() == command for line in lines):
+        print(f"'{command}' already exists in {bashrc_path}")
+    elif any(line.strip() == stale_command for line in lines):
+        with open(bashrc_path, "w") as bashrc_file:
+            bashrc_file.writelines(
+                f"{command}\n" if line.strip() == stale_command else line
+                for line in lines
+            )
+        print(f"Replaced '{stale_command}' with '{command}' in {bashrc_path}")
+    else:
+        with open(bashrc_path, "a") as bashrc_append:
+            bashrc_append.write(f"\n{command}\n")
+        print(f"Added '{command}' to {bashrc_path}")
 
+    user = os.getlogin()
     sudoers_path = f"/etc/sudoers.d/lxc-shell-menu"
-    sudoers_rule = f"{os.getlogin()} ALL=(ALL) NOPASSWD: {target_path} --bashrc\n"
+    sudoers_rule = f"{user} ALL=(ALL) NOPASSWD: {target_path} --bashrc, {fast_path} --bashrc\n"
 
+    # Write the rule to a tempfile and rename it into place so sudo never
+    # sees a partially written file.
     try:
-        with open(sudoers_path, "w") as sudoers_file:
+        tmp_path = "/etc/sudoers.d/.lxc-shell-menu.tmp"
+        with open(tmp_path, "w") as sudoers_file:
             sudoers_file.write(sudoers_rule)
+        os.chmod(tmp_path, 0o440)
+        os.replace(tmp_path, sudoers_path)
         print(f"Added sudoers rule to {sudoers_path}")
     except Exception as e:
         print(f"Error adding sudoers rule: {e}")
 
-def parse_mount_config(line):
+def parse_mount_config(line, host_cwd):
     parts = line.split()
     if len(parts) >= 5:
         host_path = parts[2].rstrip('/')
         mount_target = parts[3].rstrip('/')
-        host_cwd = os.getcwd().rstrip('/')
 
-        if host_cwd.startswith(host_path):
-            rel = os.path.relpath(host_cwd, host_path)
-            mount_point = '/' + os.path.basename(mount_target)
-            container_path = os.path.join(mount_point, rel)
-            return container_path
+        # Guard the prefix match with a separator so /home/foo doesn't
+        # match host_path /home/f, and stick to plain string ops instead
+        # of the os.path machinery.
+        if host_cwd == host_path or host_cwd.startswith(host_path + '/'):
+            rel = host_cwd[len(host_path):].lstrip('/')
+            mount_point = '/' + mount_target.rsplit('/', 1)[-1]
+            return mount_point + ('/' + rel if rel else '')
     return None
 
-def display_containers_in_grid(container_names):
-    if display_container_status:
-        container_names_with_status = container_names.copy()
-        for i, container in enumerate(container_names):
-            if i == 0:
-                continue
-            try:
-                result = subprocess.run(
-                    ["lxc-info", "-n", container], 
-                    capture_output=True, 
-                    text=True, 
-                    check=True
-                )
-                if "RUNNING" in result.stdout:
-                    container_names_with_status[i] = f"{container_names[i]} ✓"
-                else:
-                    container_names_with_status[i] = f"{container_names[i]} ✘"
-            except subprocess.CalledProcessError as e:
-                pass
+def is_container_running(container):
+    # A running container has a payload cgroup (v2 unified layout) or a
+    # monitor directory under /run/lxc (v1 hosts); both are plain stat(2)s,
+    # no need to fork lxc-info just for the RUNNING bit.
+    return (
+        os.path.isdir(f"/sys/fs/cgroup/lxc.payload.{container}")
+        or os.path.isdir(f"/run/lxc/{container}")
+    )
+
+def fetch_running_containers(container_names):
+    return {c for c in container_names if is_container_running(c)}
+
+def fetch_container_state():
+    try:
+        lxc_mtime = os.stat("/var/lib/lxc").st_mtime_ns
+    except OSError:
+        lxc_mtime = None
+
+    try:
+        with open(state_cache_path, "r") as cache_file:
+            cache = json.load(cache_file)
+        if cache["mtime"] == lxc_mtime and time.time() - cache["ts"] < state_cache_ttl:
+            return cache["names"], set(cache["running"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # lxc-ls with no arguments just lists the subdirectories of the default
+    # lxcpath; read it directly and save a fork+exec. Fall back to lxc-ls
+    # for setups with a non-default lxcpath.
+    container_names = None
+    if "LXC_PATH" not in os.environ:
+        try:
+            container_names = sorted(
+                entry.name for entry in os.scandir("/var/lib/lxc") if entry.is_dir()
+            )
+        except FileNotFoundError:
+            pass
+    if container_names is None:
+        # close_fds=False skips the pre-exec fd-closing pass; safe here
+        # because nothing sensitive is open when this short-lived helper
+        # runs.
+        result = subprocess.run(
+            ["lxc-ls"],
+            capture_output=True,
+            text=True,
+            check=True,
+            close_fds=False
+        )
+        container_names = result.stdout.split()
+    running = fetch_running_containers(container_names) if display_container_status else set()
+
+    try:
+        tmp_path = state_cache_path + ".tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump({
+                "mtime": lxc_mtime,
+                "ts": time.time(),
+                "names": container_names,
+                "running": sorted(running),
+            }, cache_file)
+        os.replace(tmp_path, state_cache_path)
+    except OSError:
+        pass
+
+    return container_names, running
+
+def invalidate_container_state_cache():
+    try:
+        os.remove(state_cache_path)
+    except OSError:
+        pass
+
+def display_containers_in_grid(container_names, running):
+    # Build the colored cells in a single pass, tracking the visible width
+    # separately so the ANSI escapes don't skew the column padding.
+    display_names = []
+    visible_lens = []
+    for i, container in enumerate(container_names):
+        if display_container_status and i > 0:
+            marker = "\033[92m●\033[0m" if container in running else "\033[91m●\033[0m"
+            display_names.append(f"{container} {marker}")
+            visible_lens.append(len(container) + 2)
+        else:
+            display_names.append(container)
+            visible_lens.append(len(container))
 
     try: term_width = os.get_terminal_size().columns
     except OSError: term_width = 80
 
-    max_len = max(len(c) for c in container_names) + 5
+    max_len = max(visible_lens) + 5
     num_columns = max(1, term_width // max_len)
     num_rows = (len(container_names) + num_columns - 1) // num_columns
 
+    lines = []
     for row in range(num_rows):
         row_items = []
         for col in range(num_columns):
             index = row + col * num_rows
             if index < len(container_names):
-                if display_container_status:
-                    item = container_names_with_status[index].ljust(max_len)
-                    item = item.replace("✓", "\033[92m●\033[0m").replace("✘", "\033[91m●\033[0m")
-                else:
-                    item = container_names[index].ljust(max_len)
-                row_items.append(item)
-        print(''.join(row_items))
+                padding = " " * (max_len - visible_lens[index])
+                row_items.append(display_names[index] + padding)
+        lines.append(''.join(row_items))
+    # One write for the whole grid instead of a flushing print per row.
+    sys.stdout.write("\n".join(lines) + "\n")
 
 def container_interface():
     if os.geteuid() != 0:
+        # With cached sudo credentials, exec the installed binary directly
+        # instead of re-running the interpreter with the full argv, skipping
+        # one Python bootstrap per login.
+        target_path = "/usr/local/bin/lxc-shell-menu-fast"
+        if not os.path.exists(target_path):
+            target_path = "/usr/local/bin/lxc-shell-menu"
+        probe = subprocess.run(["sudo", "-n", "true"], capture_output=True)
+        if probe.returncode == 0 and os.path.exists(target_path):
+            os.execvp("sudo", ["sudo", "-n", target_path, "--bashrc"])
         subprocess.run(
             ["sudo"] + sys.argv
         )
         sys.exit(0)
 
     try:
-        result = subprocess.run(
-            ["lxc-ls"], 
-            capture_output=True, 
-            text=True, 
-            check=True
-        )
-        container_names = result.stdout.split()
+        names, running = fetch_container_state()
     except Exception as e:
         print(f"Error fetching container list: {e}")
         return
 
-    container_names.insert(0, "host")
+    container_names = ["host", *names]
+
+    import bisect
+    import readline
+
+    # Index the names once so each TAB press is a binary search over the
+    # sorted lowercase keys instead of a scan of the whole list.
+    lowered = sorted((c.lower(), c) for c in container_names)
+    lower_keys = [key for key, _ in lowered]
 
     def completer(text, state):
-        options = [c for c in container_names if c.lower().startswith(text.lower())]
-        if state < len(options):
-            return options[state]
+        prefix = text.lower()
+        lo = bisect.bisect_left(lower_keys, prefix)
+        hi = bisect.bisect_left(lower_keys, prefix + "\uffff")
+        if lo + state < hi:
+            return lowered[lo + state][1]
         return None
 
     readline.set_completer(completer)
     readline.parse_and_bind("tab: complete")
 
     print("Choose container to start:")
-    display_containers_in_grid(container_names)
+    display_containers_in_grid(container_names, running)
 
     while True:
         container_name = input("> ").strip()
@@ -170,10 +272,11 @@ def container_interface():
 
     try:
         subprocess.run(
-            ["lxc-start", container_name], 
+            ["lxc-start", container_name],
             check=True,
             stderr=subprocess.DEVNULL
         )
+        invalidate_container_state_cache()
     except subprocess.CalledProcessError as e:
         sys.exit(e.returncode)
 
@@ -181,11 +284,22 @@ def container_interface():
     destination_path = None
     config_path = f"/var/lib/lxc/{container_name}/config"
 
+    host_cwd = os.getcwd().rstrip('/')
     try:
-        with open(config_path, "r") as config_file:
-            for line in config_file:
-                if line.startswith("lxc.mount.entry"):
-                    destination_path = parse_mount_config(line)
+        import mmap
+        with open(config_path, "rb") as config_file:
+            try:
+                mapped = mmap.mmap(config_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                mapped = None
+            # One kernel-side search decides whether the line parse is
+            # needed at all; configs without mount entries skip it.
+            if mapped and mapped.find(b"lxc.mount.entry") != -1:
+                for raw_line in iter(mapped.readline, b""):
+                    if raw_line.startswith(b"lxc.mount.entry"):
+                        destination_path = parse_mount_config(raw_line.decode(), host_cwd)
+                        if destination_path:
+                            break
     except FileNotFoundError:
         print(f"Config file not found: {config_path}")
         return
@@ -202,19 +316,31 @@ def container_interface():
 
     print(f"Attaching to container '{container_name}'. Press Ctrl+D or type exit to leave.")
     shell = "/bin/bash"
+    # Replace this process with lxc-attach instead of keeping a Python
+    # parent resident for the whole container session.
     if destination_path is None:
-        subprocess.run(
+        os.execvp(
+            "lxc-attach",
             ["lxc-attach", "-n", container_name, "--", shell]
         )
     else:
-        subprocess.run(
-            ["lxc-attach", "-n", container_name, "--", shell, "-c", f"cd {destination_path} && {shell}"]
+        import shlex
+        os.execvp(
+            "lxc-attach",
+            ["lxc-attach", "-n", container_name, "--", shell, "-c", f"cd {shlex.quote(destination_path)} && exec {shell}"]
         )
 
 def main():
     capture_terminal_settings()
     signal.signal(signal.SIGINT, restore_terminal_settings_and_exit)
 
+    # --bashrc runs on every new shell; skip the argparse import and
+    # parser construction entirely on that path.
+    if len(sys.argv) == 2 and sys.argv[1] in ("--bashrc", "--menu"):
+        container_interface()
+        return
+
+    import argparse
     parser = argparse.ArgumentParser(
         description="A convenient interactive menu for starting LXC containers",
         usage="%(prog)s [--install | --menu]",
@@ -244,10 +370,7 @@ def main():
     if args.install:
         install()
 
-    if args.menu:
-        container_interface()
-
-    if args.bashrc:
+    if args.menu or args.bashrc:
         container_interface()
 
 if __name__ == "__main__":